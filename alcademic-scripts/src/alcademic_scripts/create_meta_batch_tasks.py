@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from zhipuai import ZhipuAI
 from dotenv import load_dotenv
 import os
@@ -6,33 +7,39 @@ load_dotenv()
 
 PART_COUNT = 9
 
-def main():
-    api_key = os.getenv("ZHIPUAI_API_KEY")
-    if api_key is None:
-        raise ValueError("Please set the ZHIPUAI_API_KEY environment variable.")
+def upload_one(client: ZhipuAI, i: int):
+    """Uploads batch file part i and creates its batch job."""
+    file_name = f"pdfs/batch_jsonl_part_{i}.jsonl"
+    print(f"({i}/{PART_COUNT + 1}) Uploading file:", file_name)
 
-    client = ZhipuAI(api_key=api_key)
-    for i in range(1, PART_COUNT + 1):
-        file_name = f"pdfs/batch_jsonl_part_{i}.jsonl"
-        print(f"({i}/{PART_COUNT + 1}) Uploading file:", file_name)
-
-        file = open(file_name, "rb")
+    # Pass an open file, not a path: the SDK hands file objects to httpx, which streams
+    # the multipart body in chunks, whereas paths are read fully into memory first
+    with open(file_name, "rb") as file:
         zhipu_file = client.files.create(
             file = file,
             purpose = "batch",
         )
 
-        print(f"({i}/{PART_COUNT + 1}) Uploaded file. ID:", zhipu_file.id)
+    print(f"({i}/{PART_COUNT + 1}) Uploaded file. ID:", zhipu_file.id)
 
-        batch = client.batches.create(
-            input_file_id=zhipu_file.id,
-            endpoint="/v4/chat/completions",
-            completion_window="24h",
-            metadata={
-                "description": f"Paper metadata extraction part {i}/{PART_COUNT + 1}"
-            }
-        )
+    batch = client.batches.create(
+        input_file_id=zhipu_file.id,
+        endpoint="/v4/chat/completions",
+        completion_window="24h",
+        metadata={
+            "description": f"Paper metadata extraction part {i}/{PART_COUNT + 1}"
+        }
+    )
 
-        print(f"({i}/{PART_COUNT + 1}) Created batch:", batch)
+    print(f"({i}/{PART_COUNT + 1}) Created batch:", batch)
 
-        file.close()
+def main():
+    api_key = os.getenv("ZHIPUAI_API_KEY")
+    if api_key is None:
+        raise ValueError("Please set the ZHIPUAI_API_KEY environment variable.")
+
+    # The parts are independent, so upload them all at once over a shared client
+    client = ZhipuAI(api_key=api_key)
+    with ThreadPoolExecutor(max_workers=PART_COUNT) as executor:
+        # Consume the results so an exception from any part is re-raised here
+        list(executor.map(lambda i: upload_one(client, i), range(1, PART_COUNT + 1)))
@@ -1,9 +1,135 @@
+import asyncio
+import os
+import struct
+import zipfile
+import zlib
+
+import aiofiles
+import aiohttp
 from remotezip import RemoteZip
 
+URL = "https://open-data-set.oss-cn-beijing.aliyuncs.com/dataset/pdf11000.zip"
+FILE_COUNT = 1000
+MAX_CONCURRENCY = 64
+OUTPUT_DIR = "./pdfs"
+CHUNK_SIZE = 1 << 16
+
+# Indices of the file name and extra field lengths in the local file header
+LOCAL_HEADER_FILENAME_LENGTH = 10
+LOCAL_HEADER_EXTRA_LENGTH = 11
+
+# General purpose flag bit set on encrypted entries
+FLAG_ENCRYPTED = 0x1
+
+async def open_range(session: aiohttp.ClientSession, start: int, end: int) -> aiohttp.ClientResponse:
+    """Issues a GET for the inclusive byte range [start, end] of the archive."""
+    response = await session.get(URL, headers={"Range": f"bytes={start}-{end}"})
+    if response.status != 206:
+        response.release()
+        raise IOError(f"Expected a partial response for bytes {start}-{end}, got HTTP {response.status}.")
+    return response
+
+def member_path(info: zipfile.ZipInfo) -> str | None:
+    """
+    Maps an archive member to its path under OUTPUT_DIR, sanitized the way ZipFile.extract does.
+    Returns None for names that are empty or would resolve outside OUTPUT_DIR.
+    """
+    name = info.filename.replace("/", os.path.sep)
+    if os.path.altsep:
+        name = name.replace(os.path.altsep, os.path.sep)
+
+    # Drop drive letters, leading slashes and '.' or '..' components
+    name = os.path.splitdrive(name)[1]
+    parts = [part for part in name.split(os.path.sep) if part not in ("", os.path.curdir, os.path.pardir)]
+    if not parts:
+        return None
+
+    target_path = os.path.normpath(os.path.join(OUTPUT_DIR, *parts))
+    output_root = os.path.realpath(OUTPUT_DIR)
+    if os.path.commonpath([output_root, os.path.realpath(target_path)]) != output_root:
+        return None
+    return target_path
+
+async def extract_fallback(archive: RemoteZip, lock: asyncio.Lock, info: zipfile.ZipInfo):
+    """Extracts an entry the streaming path cannot handle with RemoteZip, one at a time."""
+    async with lock:
+        try:
+            await asyncio.to_thread(archive.extract, info, OUTPUT_DIR)
+        except NotImplementedError as e:
+            print(f"Skipping '{info.filename}': {e}")
+
+async def extract_one(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    archive: RemoteZip,
+    fallback_lock: asyncio.Lock,
+    info: zipfile.ZipInfo
+):
+    target_path = member_path(info)
+    if target_path is None:
+        print(f"Skipping '{info.filename}': the path is empty or outside '{OUTPUT_DIR}'.")
+        return
+
+    if info.is_dir():
+        os.makedirs(target_path, exist_ok=True)
+        return
+
+    # No password is available, and RemoteZip would raise for encrypted entries too
+    if info.flag_bits & FLAG_ENCRYPTED:
+        print(f"Skipping encrypted file '{info.filename}'.")
+        return
+
+    # Only stored and deflated entries can be decompressed while streaming
+    if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        await extract_fallback(archive, fallback_lock, info)
+        return
+
+    async with semaphore:
+        # The local header's extra field may differ from the central directory, so read it first
+        header_end = info.header_offset + zipfile.sizeFileHeader - 1
+        async with await open_range(session, info.header_offset, header_end) as response:
+            header = struct.unpack(zipfile.structFileHeader, await response.read())
+
+        data_start = (
+            header_end + 1
+            + header[LOCAL_HEADER_FILENAME_LENGTH]
+            + header[LOCAL_HEADER_EXTRA_LENGTH]
+        )
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+        if info.compress_size == 0:
+            async with aiofiles.open(target_path, "wb"):
+                return
+
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if info.compress_type == zipfile.ZIP_DEFLATED else None
+        crc = 0
+        async with await open_range(session, data_start, data_start + info.compress_size - 1) as response:
+            async with aiofiles.open(target_path, "wb") as outfile:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    if decompressor is not None:
+                        chunk = decompressor.decompress(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    await outfile.write(chunk)
+
+                if decompressor is not None:
+                    chunk = decompressor.flush()
+                    crc = zlib.crc32(chunk, crc)
+                    await outfile.write(chunk)
+
+    if crc != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file '{info.filename}'.")
+
+async def download(archive: RemoteZip, infos: list[zipfile.ZipInfo]):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    fallback_lock = asyncio.Lock()
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(extract_one(session, semaphore, archive, fallback_lock, info) for info in infos))
+
 def main():
     # Download first 999 pdfs
-    url = "https://open-data-set.oss-cn-beijing.aliyuncs.com/dataset/pdf11000.zip"
-    with RemoteZip(url) as z:
-        all_files = z.namelist()
-        for file_name in all_files[:1000]:
-            z.extract(file_name, path='./pdfs')
+    # Only the central directory is fetched here; entries are then downloaded with concurrent range requests
+    # The archive stays open for entries that have to be extracted through RemoteZip
+    with RemoteZip(URL) as z:
+        infos = z.infolist()
+        asyncio.run(download(z, infos[:FILE_COUNT]))
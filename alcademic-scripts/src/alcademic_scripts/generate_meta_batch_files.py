@@ -1,8 +1,18 @@
-import json
 import os
 import argparse
+import hashlib
+import multiprocessing
+import queue
 import re
-from io import TextIOWrapper
+import threading
+from collections import deque
+from collections.abc import Iterable, Iterator
+from multiprocessing.pool import AsyncResult
+from io import BufferedWriter, TextIOWrapper
+
+import ijson
+import orjson
+from tqdm import tqdm
 
 DEFAULT_SYSTEM_PROMPT = "You are an expert assistant specialized in analyzing academic paper abstracts and extracting key information accurately and concisely."
 
@@ -20,6 +30,234 @@ Output the result as a single JSON object in this exact format:
 
 Use null if information for a key cannot be clearly determined from the provided text. Do not add any explanations before or after the JSON object."""
 
+# Constant parts of the user prompt, built once instead of per record
+USER_PROMPT_HEADER = """\
+## Task: Analyze the following academic paper metadata and extract the specified information based SOLELY on the provided Title and Abstract.
+
+## Input Metadata:
+Title: """
+
+USER_PROMPT_FOOTER = f"""
+
+## Extraction Fields and Output Format:
+{OUTPUT_FORMAT_INSTRUCTIONS}
+
+## Extracted JSON:"""
+
+# Bump whenever the prompt templates change so cached requests are regenerated
+PROMPT_VERSION = "1"
+
+# Name of the file inside --cache-dir listing hashes of already generated requests
+CACHE_INDEX_FILENAME = "seen.idx"
+
+# Name of the file inside --cache-dir mapping hashes of deduplicated records to their canonical ID
+DEDUP_INDEX_FILENAME = "dedup.idx"
+
+# Translation table deleting C0/C1 control characters
+CONTROL_CHARS_TABLE = dict.fromkeys([*range(0x00, 0x20), *range(0x7F, 0xA0)])
+
+# Number of serialized lines buffered before they are flushed to the output file
+WRITE_BATCH_SIZE = 1000
+
+# Number of flushed batches allowed to wait for the writer thread
+MAX_PENDING_BATCHES = 16
+
+# Number of records sent to a worker process at a time when --workers > 1
+WORKER_CHUNK_SIZE = 1000
+
+# Number of chunks per worker process allowed to be queued or awaiting collection
+MAX_PENDING_CHUNKS_PER_WORKER = 2
+
+# Outcomes of encoding a single record
+RECORD_ENCODED = 0
+RECORD_MISSING_FIELDS = 1
+RECORD_EMPTY_ABSTRACT = 2
+RECORD_CACHED = 3
+
+# Hashes of previously generated requests, copied into each worker process
+worker_seen_digests: set[str] | None = None
+
+# Matches a trailing comma before the closing bracket of an array
+regex_trailing_comma = re.compile(rb',\s*]')
+
+# Matches a comma, and any whitespace after it, at the very end of a chunk
+regex_trailing_comma_tail = re.compile(rb',\s*\Z')
+
+# C0 control characters and DEL; UTF-8 never uses these bytes inside a multi-byte character
+CONTROL_BYTES = bytes(range(0x00, 0x20)) + b'\x7f'
+
+class JsonRepairReader:
+    """
+    Wraps a binary file and repairs the input as it is read, so the streaming parser accepts it:
+    backslashes not followed by a double quote are escaped, control characters are removed
+    and trailing commas before ']' are dropped.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._pending_backslash = b""
+        self._pending_tail = b""
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            chunk = self._raw.read(size)
+            data = self._pending_backslash + chunk
+            self._pending_backslash = b""
+
+            # Whether a trailing backslash is escaped depends on the next byte, so hold it back
+            if chunk and data.endswith(b"\\"):
+                data, self._pending_backslash = data[:-1], b"\\"
+
+            # Double every backslash, then undo it for those followed by a quote
+            data = data.replace(b"\\", b"\\\\").replace(b'\\\\"', b'\\"')
+            data = self._pending_tail + data.translate(None, CONTROL_BYTES)
+            self._pending_tail = b""
+
+            # A comma at the end of the chunk may be followed by ']' in the next one, so hold it back
+            if chunk:
+                tail = regex_trailing_comma_tail.search(data)
+                if tail:
+                    data, self._pending_tail = data[:tail.start()], data[tail.start():]
+
+            # An empty result means EOF to the parser, so only return one when the input is exhausted
+            if data or not chunk:
+                return regex_trailing_comma.sub(b']', data)
+
+class BackgroundWriter:
+    """Writes batches of serialized lines to output files on a dedicated thread."""
+
+    def __init__(self, index_path: str | None = None):
+        self.error: OSError | None = None
+        self.failed_filename = ""
+        self._index_path = index_path
+        self._queue: queue.Queue[tuple[str, list[bytes], list[str]] | None] = queue.Queue(maxsize=MAX_PENDING_BATCHES)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, filename: str, lines: list[bytes], digests: list[str] | None = None):
+        """
+        Queues lines to be appended to filename. The lists must not be modified afterwards.
+        Digests are appended to the cache index once their lines have been written.
+        """
+        self._queue.put((filename, lines, digests or []))
+
+    def close(self):
+        """Waits until every queued batch is written and closes the last file."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        outfile: BufferedWriter | None = None
+        index_file: TextIOWrapper | None = None
+        current_filename = ""
+        while (item := self._queue.get()) is not None:
+            # Keep draining after a failure so the producer never blocks on a full queue
+            if self.error is not None:
+                continue
+
+            filename, lines, digests = item
+            try:
+                # Files are opened lazily; a new file name means the previous chunk is complete
+                if filename != current_filename:
+                    if outfile: outfile.close()
+                    current_filename = filename
+                    outfile = open(filename, 'wb', buffering=1 << 20)
+
+                outfile.writelines(lines)
+
+                # Only record requests in the index once they have reached the output file
+                if digests and self._index_path:
+                    outfile.flush()
+                    if index_file is None:
+                        index_file = open(self._index_path, 'a', encoding='utf-8')
+                    index_file.writelines(digests)
+                    index_file.flush()
+            except OSError as e:
+                self.error = e
+                self.failed_filename = current_filename
+
+        try:
+            if outfile: outfile.close()
+            if index_file: index_file.close()
+        except OSError as e:
+            if self.error is None:
+                self.error = e
+                self.failed_filename = current_filename
+
+class OutputWriteError(Exception):
+    """Raised when the writer thread failed to write an output file."""
+
+    def __init__(self, filename: str, error: OSError):
+        super().__init__(f"Error writing to '{filename}'. Details: {error}")
+
+class OutputRotator:
+    """
+    Buffers serialized lines and hands them to a BackgroundWriter in batches,
+    splitting the output into '<prefix>_part_N.jsonl' files of at most max_lines lines.
+    """
+
+    def __init__(self, output_prefix: str, max_lines: int, writer: BackgroundWriter):
+        self.output_prefix = output_prefix
+        self.max_lines = max_lines
+        self.writer = writer
+        self.file_index = 1
+        self.count = 0
+        self.filename = self._part_filename()
+        self._announced_filename = ""
+        self._lines: list[bytes] = []
+        self._digests: list[str] = []
+
+    @property
+    def file_count(self) -> int:
+        """Number of output files that received at least one line."""
+        return self.file_index if self.count else self.file_index - 1
+
+    def write(self, line: bytes, digest: str | None = None):
+        """Buffers a line and, optionally, the cache digest to record once it is written."""
+        self._lines.append(line)
+        if digest is not None:
+            self._digests.append(digest + '\n')
+        self.count += 1
+
+        if len(self._lines) >= WRITE_BATCH_SIZE or self.count >= self.max_lines:
+            self.flush()
+            if self.count >= self.max_lines:
+                self._rotate()
+
+    def flush(self):
+        """Hands the buffered lines to the writer thread."""
+        if self.writer.error is not None:
+            raise OutputWriteError(self.writer.failed_filename, self.writer.error)
+        if not self._lines:
+            return
+
+        if self.filename != self._announced_filename:
+            tqdm.write(f"Creating/opening new output file: '{self.filename}'...")
+            self._announced_filename = self.filename
+
+        self.writer.write(self.filename, self._lines, self._digests)
+        self._lines = []
+        self._digests = []
+
+    def close(self):
+        """Flushes the remaining lines and waits for the writer to close the last file."""
+        self.flush()
+        self.writer.close()
+        if self.writer.error is not None:
+            raise OutputWriteError(self.writer.failed_filename, self.writer.error)
+
+        if self.count:
+            tqdm.write(f"Finished writing {self.count} lines to '{self.filename}'.")
+
+    def _rotate(self):
+        tqdm.write(f"Finished writing {self.count} lines to '{self.filename}'.")
+        self.file_index += 1
+        self.count = 0
+        self.filename = self._part_filename()
+
+    def _part_filename(self) -> str:
+        return f"{self.output_prefix}_part_{self.file_index}.jsonl"
+
 def create_user_prompt(title: str, authors: str | None, abstract: str | None) -> str | None:
     """Formats the user prompt for the LLM."""
     if not abstract:
@@ -32,189 +270,328 @@ def create_user_prompt(title: str, authors: str | None, abstract: str | None) ->
 
     author_str = authors.strip() if authors else "N/A"
 
-    user_content = f"""\
-## Task: Analyze the following academic paper metadata and extract the specified information based SOLELY on the provided Title and Abstract.
+    return f"{USER_PROMPT_HEADER}{title}\nAuthors: {author_str}\nAbstract: {clean_abstract}{USER_PROMPT_FOOTER}"
 
-## Input Metadata:
-Title: {title}
-Authors: {author_str}
-Abstract: {clean_abstract}
+def request_cache_key(
+    model_name: str,
+    system_prompt: str,
+    paper_id: str,
+    title: str,
+    authors: str | None,
+    abstract: str
+) -> str:
+    """Returns a hash identifying the request generated for a record with the current prompts."""
+    parts = (PROMPT_VERSION, model_name, system_prompt, str(paper_id), title, str(authors or ""), abstract)
+    return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+def load_request_cache(index_path: str) -> set[str]:
+    """Loads the hashes of requests generated by previous runs."""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            return {line.strip() for line in index_file if line.strip()}
+    except FileNotFoundError:
+        return set()
 
-## Extraction Fields and Output Format:
-{OUTPUT_FORMAT_INSTRUCTIONS}
+def load_dedup_cache(index_path: str) -> dict[str, str]:
+    """Loads the canonical IDs of records deduplicated by previous runs, keyed by request hash."""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            return dict(line.rstrip('\n').split('\t', 1) for line in index_file if line.strip())
+    except FileNotFoundError:
+        return {}
 
-## Extracted JSON:"""
+def encode_record(
+    record: dict,
+    model_name: str,
+    system_message: dict,
+    seen_digests: set[str] | None
+) -> tuple[int, object, bytes | str | None, str | None]:
+    """
+    Builds the Batch API request line for a record.
+    Returns (status, paper ID, serialized line or warning message, cache digest).
+    Digests are only computed when seen_digests is given.
+    """
+    # Extract required fields, handle potential missing keys gracefully
+    get = record.get
+    paper_id = get('_id')
+    title = get('title')
+    abstract = get('abstract')
+    authors = get('author')
+
+    # Need at least ID, title, and abstract; a short-circuit check avoids building a list per record
+    if not (paper_id and title and abstract):
+        return RECORD_MISSING_FIELDS, paper_id, f"Warning: Skipping record due to missing essential fields (ID, Title, or Abstract). Record content: {record}", None
+
+    # Remove control characters and non-UTF-8 characters; titles are only interpolated, so accept any type
+    title = str(title).translate(CONTROL_CHARS_TABLE)
+    abstract = abstract.translate(CONTROL_CHARS_TABLE)
+
+    # Skip records whose request was already generated by a previous run
+    digest = None
+    if seen_digests is not None:
+        digest = request_cache_key(model_name, system_message["content"], paper_id, title, authors, abstract)
+        if digest in seen_digests:
+            return RECORD_CACHED, paper_id, None, digest
+
+    # Create the user prompt content
+    user_content = create_user_prompt(title, authors, abstract)
+    if user_content is None:
+        return RECORD_EMPTY_ABSTRACT, paper_id, f"Warning: Skipping record ID '{paper_id}' due to empty or missing abstract after cleaning.", None
+
+    # Dict literals compile to a single map build, which is faster than copying a template
+    request_body = {
+        "model": model_name,
+        "messages": [
+            system_message,
+            {"role": "user", "content": user_content}
+        ],
+        "temperature": 0.1
+    }
+
+    jsonl_line = {
+        "custom_id": f"extract-{paper_id}",
+        "method": "POST",
+        "url": "/v4/chat/completions",
+        "body": request_body
+    }
+
+    return RECORD_ENCODED, paper_id, orjson.dumps(jsonl_line) + b'\n', digest
+
+def init_worker(seen_digests: set[str] | None):
+    global worker_seen_digests
+    worker_seen_digests = seen_digests
+
+def encode_chunk(chunk: list[dict], model_name: str, system_prompt: str) -> list[tuple]:
+    """Worker entry point: encodes a chunk of records."""
+    system_message = {"role": "system", "content": system_prompt}
+    return [encode_record(record, model_name, system_message, worker_seen_digests) for record in chunk]
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def encode_records(
+    records: Iterable[tuple[dict, object]],
+    model_name: str,
+    system_prompt: str,
+    seen_digests: set[str] | None,
+    workers: int
+) -> Iterator[tuple[tuple, object]]:
+    """
+    Yields (encode_record result, embedding) for each (record, embedding) pair, in input order.
+    With more than one worker, records are encoded in chunks by a process pool.
+    """
+    if workers <= 1:
+        system_message = {"role": "system", "content": system_prompt}
+        for record, embedding in records:
+            yield encode_record(record, model_name, system_message, seen_digests), embedding
+        return
 
-    return user_content
+    # Forking after the writer thread has started, or torch has loaded, can deadlock,
+    # so workers are started from a clean server process where the platform has one
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(start_method)
+
+    # Each worker gets its own copy of the digests loaded at startup
+    with context.Pool(workers, initializer=init_worker, initargs=(seen_digests,)) as pool:
+        # Chunks are collected in submission order, and embeddings stay in this process until then.
+        # Bounding the pending chunks keeps input from being read ahead of a stalled consumer.
+        pending: deque[tuple[AsyncResult, list]] = deque()
+        for chunk in chunked(records, WORKER_CHUNK_SIZE):
+            chunk_records = [record for record, _ in chunk]
+            result = pool.apply_async(encode_chunk, (chunk_records, model_name, system_prompt))
+            pending.append((result, [embedding for _, embedding in chunk]))
+
+            if len(pending) >= MAX_PENDING_CHUNKS_PER_WORKER * workers:
+                result, embeddings = pending.popleft()
+                yield from zip(result.get(), embeddings)
+
+        while pending:
+            result, embeddings = pending.popleft()
+            yield from zip(result.get(), embeddings)
 
 def convert_and_split_metadata(
     input_path: str,
     output_prefix: str,
     max_lines: int,
     model_name: str,
-    system_prompt: str
+    system_prompt: str,
+    cache_dir: str | None = None,
+    semantic_dedup: bool = False,
+    dedup_threshold: float = 0.95,
+    workers: int = 1
 ):
     total_processed_count = 0
     total_skipped_count = 0
-    file_index = 1
-    line_count_current_file = 0
-    outfile: [TextIOWrapper, None] = None
-    current_output_filename = ""
+    total_cached_count = 0
+    total_deduplicated_count = 0
+    request_digests: set[str] = set()
+    seen_digests: set[str] = set()
+    index_path: str | None = None
+    dedup_index_path: str | None = None
+    cached_dedup: dict[str, str] = {}
+    new_dedup_entries: list[str] = []
+    deduplicator = None
+    dedup_map: dict[str, str] = {}
+    dedup_map_filename = f"{output_prefix}_dedup_map.json"
 
     # Ensure the output directory exists
     output_dir = os.path.dirname(output_prefix)
-    if output_dir and not os.path.exists(output_dir):
+    if output_dir:
         try:
-            os.makedirs(output_dir)
-            print(f"Created output directory: '{output_dir}'")
+            os.makedirs(output_dir, exist_ok=True)
         except OSError as e:
             print(f"Error creating output directory '{output_dir}'. Details: {e}")
             return
 
-    print(f"Starting processing of '{input_path}'...")
-    print(f"Output prefix: '{output_prefix}', Chunk size: {max_lines}")
-
-    try:
-        with open(input_path, 'r', encoding='utf-8') as infile:
-            # Load the entire JSON array from the input file
-            try:
-                json_str = infile.read()
-
-                print("Attempting to fix potentially unescaped backslashes within 'abstract' fields...")
-
-                regex_fix_slash_not_quote = re.compile(r'\\(?!")')
-
-                corrected_json_text = regex_fix_slash_not_quote.sub(r'\\\\', json_str)
-                del json_str # Free memory
-
-                # Remove control characters and non-UTF-8 characters
-                corrected_json_text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', corrected_json_text)
-
-                # Remove trailing commas
-                corrected_json_text = re.sub(r',\s*]', ']', corrected_json_text)
-
-                print("Parsing corrected JSON text...")
-                metadata_list = json.loads(corrected_json_text, strict=False)
-                del corrected_json_text
+    if cache_dir:
+        index_path = os.path.join(cache_dir, CACHE_INDEX_FILENAME)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            request_digests = load_request_cache(index_path)
+        except OSError as e:
+            print(f"Error reading cache directory '{cache_dir}'. Details: {e}")
+            return
+        seen_digests = request_digests
+        print(f"Loaded {len(request_digests)} cached request hashes from '{index_path}'.")
 
-                if not isinstance(metadata_list, list):
-                    raise ValueError("Input JSON is not a list of objects.")
-            except json.JSONDecodeError as e:
-                print(f"Error: Invalid JSON file '{input_path}'. Details: {e}")
-                return
-            except ValueError as e:
-                print(f"Error: {e}")
-                return
+    if semantic_dedup:
+        try:
+            from alcademic_scripts.semantic_dedup import SemanticDeduplicator
+        except ImportError as e:
+            print(f"Error: --semantic-dedup requires the 'semantic-dedup' extra to be installed. Details: {e}")
+            return
+        deduplicator = SemanticDeduplicator(threshold=dedup_threshold)
+        print(f"Semantic deduplication enabled with similarity threshold {dedup_threshold}.")
 
-            if not metadata_list:
-                print("Input metadata file is empty. No output generated.")
+        # Records deduplicated by a previous run are skipped too, and keep their mapping
+        if cache_dir:
+            dedup_index_path = os.path.join(cache_dir, DEDUP_INDEX_FILENAME)
+            try:
+                cached_dedup = load_dedup_cache(dedup_index_path)
+            except OSError as e:
+                print(f"Error reading cache directory '{cache_dir}'. Details: {e}")
                 return
+            seen_digests = request_digests | cached_dedup.keys()
+            print(f"Loaded {len(cached_dedup)} cached duplicate mappings from '{dedup_index_path}'.")
 
-            print(f"Loaded {len(metadata_list)} records from metadata file.")
+    print(f"Starting processing of '{input_path}'...")
+    print(f"Output prefix: '{output_prefix}', Chunk size: {max_lines}")
 
-            # Process each record
-            for record in metadata_list:
-                # Extract required fields, handle potential missing keys gracefully
-                paper_id = record.get('_id')
-                title = record.get('title')
-                abstract = record.get('abstract')
-                authors = record.get('author')
+    writer = BackgroundWriter(index_path)
+    rotator = OutputRotator(output_prefix, max_lines, writer)
 
-                # Need at least ID, title, and abstract
-                if not all([paper_id, title, abstract]):
-                    print(f"Warning: Skipping record due to missing essential fields (ID, Title, or Abstract). Record content: {record}")
+    try:
+        with open(input_path, 'rb') as infile:
+            # Stream the JSON array one record at a time instead of loading the whole file
+            print("Repairing backslashes, control characters and trailing commas while streaming the input...")
+            records = ijson.items(JsonRepairReader(infile), 'item', use_float=True)
+            if deduplicator is not None:
+                records = deduplicator.with_embeddings(records)
+            else:
+                records = ((record, None) for record in records)
+
+            encoded = encode_records(records, model_name, system_prompt, seen_digests if index_path else None, workers)
+
+            # Progress is reported by tqdm, so messages inside the loop go through tqdm.write
+            for (status, paper_id, payload, digest), embedding in tqdm(encoded, unit='rec', smoothing=0.1):
+                if status == RECORD_MISSING_FIELDS or status == RECORD_EMPTY_ABSTRACT:
+                    tqdm.write(payload)
                     total_skipped_count += 1
                     continue
 
-                # Create the user prompt content
-                user_content = create_user_prompt(title, authors, abstract)
-                if user_content is None:
-                    print(f"Warning: Skipping record ID '{paper_id}' due to empty or missing abstract after cleaning.")
-                    total_skipped_count += 1
+                # Only digests loaded at startup count, so repeats within this run are emitted as without a cache
+                if status == RECORD_CACHED:
+                    # A hash found in both caches was also emitted, so the request cache wins
+                    canonical_id = cached_dedup.get(digest)
+                    if canonical_id is not None and digest not in request_digests:
+                        dedup_map[str(paper_id)] = canonical_id
+                        total_deduplicated_count += 1
+                        continue
+
+                    # Register the cached record so near-duplicates later in the input still map to it
+                    if deduplicator is not None:
+                        deduplicator.find_duplicate(paper_id, embedding)
+                    total_cached_count += 1
                     continue
 
-                # Check if a new output file needs to be opened
-                if line_count_current_file == 0:
-                    # Close the previous file if it's open
-                    if outfile and not outfile.closed:
-                        print(f"Finished writing {max_lines} lines to '{current_output_filename}'.")
-                        outfile.close()
-
-                    current_output_filename = f"{output_prefix}_part_{file_index}.jsonl"
-                    print(f"Creating/opening new output file: '{current_output_filename}'...")
-                    try:
-                        outfile = open(current_output_filename, 'w', encoding='utf-8')
-                    except IOError as e:
-                        print(f"Error opening output file '{current_output_filename}'. Details: {e}")
-                        return # Stop processing
-
-                request_body = {
-                    "model": model_name,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_content}
-                    ],
-                    "temperature": "0.1"
-                }
-
-                jsonl_line = {
-                    "custom_id": f"extract-{paper_id}",
-                    "method": "POST",
-                    "url": "/v4/chat/completions",
-                    "body": request_body
-                }
-
-                try:
-                    if outfile is None:
-                        raise IOError("Output file is not open.")
-
-                    json.dump(jsonl_line, outfile, ensure_ascii=False)
-                    outfile.write('\n')
-                except IOError as e:
-                    print(f"Error writing to '{current_output_filename}'. Details: {e}")
-                    if outfile and not outfile.closed: outfile.close()
-                    return # Stop processing
-
-                line_count_current_file += 1
+                # Reuse the request of an already emitted record with a near-identical abstract
+                if deduplicator is not None:
+                    canonical_id = deduplicator.find_duplicate(paper_id, embedding)
+                    if canonical_id is not None:
+                        dedup_map[str(paper_id)] = str(canonical_id)
+                        if digest is not None:
+                            new_dedup_entries.append(f"{digest}\t{canonical_id}\n")
+                        total_deduplicated_count += 1
+                        continue
+
+                rotator.write(payload, digest)
                 total_processed_count += 1
 
-                # Check if the current file chunk is full
-                if line_count_current_file >= max_lines:
-                    file_index += 1
-                    line_count_current_file = 0 # Reset counter for the next file
-                    # File will be closed at the start of the next iteration or after the loop
-
-                # Progress reporting
-                if total_processed_count % 1000 == 0:
-                    print(f"Processed {total_processed_count} records...")
-
+    except OutputWriteError as e:
+        print(e)
+        writer.close()
+        return # Stop processing
+    except ijson.JSONError as e:
+        print(f"Error: Invalid JSON file '{input_path}'. Details: {e}")
+        writer.close()
+        return
     except FileNotFoundError:
         print(f"Error: Input file not found at '{input_path}'")
-        if outfile and not outfile.closed: outfile.close() # Clean up if error occurred after opening a file
+        writer.close() # Clean up if error occurred after opening a file
         return
     except IOError as e:
         print(f"Error reading input file '{input_path}'. Details: {e}")
-        if outfile and not outfile.closed: outfile.close()
+        writer.close()
         return
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        if outfile and not outfile.closed: outfile.close()
+        writer.close()
         return
 
-    # Close the last opened file if it exists and wasn't closed by reaching max_lines
-    if outfile and not outfile.closed:
-        print(f"Finished writing {line_count_current_file} lines to '{current_output_filename}'.")
-        outfile.close()
+    # Flush the remaining lines and wait for the writer to close the last file
+    try:
+        rotator.close()
+    except OutputWriteError as e:
+        print(e)
+        return
+
+    # Let downstream consumers fan the canonical record's response out to its duplicates
+    if deduplicator is not None:
+        try:
+            with open(dedup_map_filename, 'wb') as dedup_file:
+                dedup_file.write(orjson.dumps(dedup_map, option=orjson.OPT_INDENT_2))
+            print(f"Wrote {len(dedup_map)} duplicate mappings to '{dedup_map_filename}'.")
+        except OSError as e:
+            print(f"Error writing to '{dedup_map_filename}'. Details: {e}")
+            return
+
+    if dedup_index_path and new_dedup_entries:
+        try:
+            with open(dedup_index_path, 'a', encoding='utf-8') as dedup_index:
+                dedup_index.writelines(new_dedup_entries)
+        except OSError as e:
+            print(f"Error writing to '{dedup_index_path}'. Details: {e}")
+            return
 
     # Final report
     print("-" * 30)
     print(f"Processing finished.")
-    if total_processed_count == 0 and total_skipped_count == 0:
+    if total_processed_count == 0 and total_skipped_count == 0 and total_cached_count == 0 and total_deduplicated_count == 0:
          print("Input file was likely empty or contained no valid processable records.")
     else:
-        final_file_count = file_index if line_count_current_file == 0 and total_processed_count > 0 else file_index
-        print(f"Successfully processed and wrote {total_processed_count} records into {final_file_count} file(s).")
+        print(f"Successfully processed and wrote {total_processed_count} records into {rotator.file_count} file(s).")
         print(f"Skipped {total_skipped_count} records due to missing data or empty abstracts.")
+        if index_path:
+            print(f"Skipped {total_cached_count} records already generated by a previous run.")
+        if deduplicator is not None:
+            print(f"Skipped {total_deduplicated_count} records with near-duplicate abstracts.")
     print("-" * 30)
 
 
@@ -259,15 +636,48 @@ def main():
         help="The content for the 'system' role message."
     )
 
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory holding hashes of previously generated requests. Records already generated with the same model and prompts are skipped, so use a new --output-prefix for each incremental run."
+    )
+
+    parser.add_argument(
+        "--semantic-dedup",
+        action="store_true",
+        help="Skip records whose abstract is a near-duplicate of an already emitted one and write a '<prefix>_dedup_map.json' mapping skipped IDs to their canonical ID. With --cache-dir, the mappings are kept across runs. Requires the 'semantic-dedup' extra."
+    )
+
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.95,
+        help="Minimum cosine similarity between abstract embeddings for records to be considered duplicates."
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to build and serialize requests. Parsing, deduplication and writing stay in the main process."
+    )
+
     args = parser.parse_args()
 
     if args.chunk_size <= 0:
         print("Error: Chunk size must be a positive integer.")
+    elif args.workers <= 0:
+        print("Error: Worker count must be a positive integer.")
     else:
         convert_and_split_metadata(
             args.input_json,
             args.output_prefix,
             args.chunk_size,
             args.model,
-            args.system_prompt
+            args.system_prompt,
+            args.cache_dir,
+            args.semantic_dedup,
+            args.dedup_threshold,
+            args.workers
         )
\ No newline at end of file
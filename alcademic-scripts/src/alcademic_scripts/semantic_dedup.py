@@ -0,0 +1,87 @@
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_THRESHOLD = 0.95
+
+# Number of abstracts embedded per model call
+ENCODE_BATCH_SIZE = 256
+
+# Random-hyperplane LSH layout. With 10 tables of 10 bits, two abstracts at cosine
+# similarity 0.95 share at least one bucket with probability of roughly 98%.
+LSH_TABLES = 10
+LSH_BITS_PER_TABLE = 10
+
+class SemanticDeduplicator:
+    """Detects near-duplicate abstracts by the cosine similarity of their sentence embeddings."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._model = SentenceTransformer(model_name)
+
+        dimension = self._model.get_sentence_embedding_dimension()
+        rng = np.random.default_rng(0)
+        self._planes = rng.standard_normal((dimension, LSH_TABLES * LSH_BITS_PER_TABLE)).astype(np.float32)
+        self._bit_weights = 1 << np.arange(LSH_BITS_PER_TABLE, dtype=np.int64)
+
+        self._ids: list[str] = []
+        self._vectors = np.empty((1024, dimension), dtype=np.float32)
+        self._buckets: list[dict[int, list[int]]] = [{} for _ in range(LSH_TABLES)]
+
+    def with_embeddings(self, records: Iterable[dict]) -> Iterator[tuple[dict, np.ndarray]]:
+        """Yields each record with the embedding of its abstract, encoding in batches."""
+        batch: list[dict] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= ENCODE_BATCH_SIZE:
+                yield from self._encode_batch(batch)
+                batch = []
+        if batch:
+            yield from self._encode_batch(batch)
+
+    def find_duplicate(self, paper_id: str, embedding: np.ndarray) -> str | None:
+        """
+        Returns the ID of a previously added record whose abstract is at least `threshold` similar.
+        Otherwise, adds the record as a new canonical entry and returns None.
+        """
+        keys = self._bucket_keys(embedding)
+
+        candidates: set[int] = set()
+        for table, key in zip(self._buckets, keys):
+            candidates.update(table.get(key, ()))
+
+        if candidates:
+            indices = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarities = self._vectors[indices] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return self._ids[indices[best]]
+
+        self._add(paper_id, embedding, keys)
+        return None
+
+    def _encode_batch(self, batch: list[dict]) -> Iterator[tuple[dict, np.ndarray]]:
+        abstracts = [str(record.get('abstract') or "").strip() for record in batch]
+        embeddings = self._model.encode(
+            abstracts,
+            batch_size=ENCODE_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return zip(batch, embeddings.astype(np.float32, copy=False))
+
+    def _bucket_keys(self, embedding: np.ndarray) -> list[int]:
+        bits = (embedding @ self._planes > 0).reshape(LSH_TABLES, LSH_BITS_PER_TABLE)
+        return (bits @ self._bit_weights).tolist()
+
+    def _add(self, paper_id: str, embedding: np.ndarray, keys: list[int]):
+        index = len(self._ids)
+        if index == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.empty_like(self._vectors)])
+
+        self._vectors[index] = embedding
+        self._ids.append(paper_id)
+        for table, key in zip(self._buckets, keys):
+            table.setdefault(key, []).append(index)